@@ -1,6 +1,13 @@
 import functools
 import bisect
 import time
+from typing import Iterable, Iterator, NamedTuple, Optional
+
+import profiling
+from profiling import profiled
+
+# The enumeration takes about 80s per call on matt.txt, so only input.txt
+BENCHMARKS = (("part1_enumerate", "input.txt"),)
 
 denominations = [
     (5, 0),
@@ -10,20 +17,12 @@ denominations = [
     (20, 4)
 ]
 
-def min_containers(ans: list[tuple[int,int]]) -> int:
-    minimum = len(min(ans, key=lambda x: len(x)))
-    count = 0
-    for a in ans:
-        if len(a) == minimum:
-            count += 1
-    return count
-
-total = 0
+def min_containers(ans: Iterable[tuple[tuple[int,int], ...]]) -> int:
+    return aggregate_containers(ans).at_minimum
 
+@profiled()
 @functools.cache
 def make_containers(amount: int, choices: tuple[tuple[int,int]], denominations_left: tuple[tuple[int, int]]) -> list[tuple[int,int]]:
-    global total 
-    total += 1
     #print(amount, choices, denominations_left)
     ret = []
     if amount == 0:
@@ -44,31 +43,115 @@ def make_containers(amount: int, choices: tuple[tuple[int,int]], denominations_l
                     ret.append(lc)
     return ret
 
-t0 = time.time()
-ans = make_containers(25, tuple([]), tuple(denominations))
-#print(ans)
-print(len(ans))
-print(min_containers(ans))
-t1 = time.time()
-print(f"{t1-t0} seconds")
-print(total)
-total = 0
-
-
-
-with open("matt.txt", 'r') as f:
-    i = 0
-    denominations = []
-    for line in f:
-        #print(line)
-        denominations.append((int(line), i))
-        i += 1
-t0 = time.time()
-ans = make_containers(150, tuple([]), tuple(denominations ))
-#print(ans)
-print(len(ans))
-print(min_containers(ans))
-t1 = time.time()
-print(f"{t1-t0} seconds")
-
-print(total)
\ No newline at end of file
+class Combinations(NamedTuple):
+    total: int
+    minimum: Optional[int]
+    at_minimum: int
+
+def count_combinations(amount: int, containers: list[tuple[int,int]]) -> Combinations:
+    # 0/1 knapsack over the litres still to fill, one container at a time:
+    # ways[c] counts subsets holding exactly c litres, fewest[c] is the
+    # smallest such subset and at_fewest[c] how many subsets have that size.
+    # O(len(containers) * amount) time, O(amount) memory.
+    ways = [1] + [0] * amount
+    fewest = [0] + [None] * amount
+    at_fewest = [1] + [0] * amount
+    for size, _ in containers:
+        for c in range(amount, size - 1, -1):
+            if ways[c - size] == 0:
+                continue
+            ways[c] += ways[c - size]
+            candidate = fewest[c - size] + 1
+            if fewest[c] is None or candidate < fewest[c]:
+                fewest[c] = candidate
+                at_fewest[c] = at_fewest[c - size]
+            elif candidate == fewest[c]:
+                at_fewest[c] += at_fewest[c - size]
+    return Combinations(ways[amount], fewest[amount], at_fewest[amount])
+
+def iter_containers(amount: int, containers: list[tuple[int,int]]) -> Iterator[tuple[tuple[int,int], ...]]:
+    """
+    Lazily yield every combination holding exactly amount litres, once each.
+
+    Combinations are tuples sorted like make_containers' (by size, then
+    index) and come out in lexicographic order. Only the current path is
+    kept, so memory is O(len(containers)) however many combinations exist.
+    """
+    containers = sorted(containers)
+    # remaining[i] is what containers[i:] hold together; sizes are sorted,
+    # so once a container is too big or the rest too small, stop the level.
+    remaining = [0] * (len(containers) + 1)
+    for i in range(len(containers) - 1, -1, -1):
+        remaining[i] = remaining[i + 1] + containers[i][0]
+    chosen = []
+
+    def search(start: int, left: int) -> Iterator[tuple[tuple[int,int], ...]]:
+        if left == 0:
+            yield tuple(chosen)
+            return
+        for i in range(start, len(containers)):
+            if containers[i][0] > left or remaining[i] < left:
+                break
+            chosen.append(containers[i])
+            yield from search(i + 1, left - containers[i][0])
+            chosen.pop()
+
+    return search(0, amount)
+
+def aggregate_containers(combinations: Iterable[tuple[tuple[int,int], ...]]) -> Combinations:
+    # Single pass, so it can consume iter_containers as it streams
+    total = 0
+    minimum = None
+    at_minimum = 0
+    for combination in combinations:
+        total += 1
+        if minimum is None or len(combination) < minimum:
+            minimum = len(combination)
+            at_minimum = 1
+        elif len(combination) == minimum:
+            at_minimum += 1
+    return Combinations(total, minimum, at_minimum)
+
+def read_containers(file_name: str) -> list[tuple[int,int]]:
+    with open(file_name, 'r') as f:
+        i = 0
+        containers = []
+        for line in f:
+            #print(line)
+            containers.append((int(line), i))
+            i += 1
+    return containers
+
+def part1(file_name: str, amount: int = 150) -> int:
+    return count_combinations(amount, read_containers(file_name)).total
+
+def part2(file_name: str, amount: int = 150) -> int:
+    return count_combinations(amount, read_containers(file_name)).at_minimum
+
+def part1_enumerate(file_name: str, amount: int = 150) -> int:
+    # The original memoized enumeration, cold every time: the memo is keyed
+    # on the choices so far, so it barely shares work (about 80s on matt.txt)
+    make_containers.cache_clear()
+    return len(make_containers(amount, tuple([]), tuple(read_containers(file_name))))
+
+def run(amount: int, containers: list[tuple[int,int]]):
+    t0 = time.time()
+    ans = make_containers(amount, tuple([]), tuple(containers))
+    #print(ans)
+    print(len(ans))
+    print(min_containers(ans))
+    t1 = time.time()
+    print(f"{t1-t0} seconds")
+    if profiling.ENABLED:
+        print(profiling.report())
+        profiling.reset()
+
+if __name__ == "__main__":
+    run(25, denominations)
+    for file_name in ("input.txt", "matt.txt"):
+        t0 = time.time()
+        print(count_combinations(150, read_containers(file_name)))
+        t1 = time.time()
+        print(aggregate_containers(iter_containers(150, read_containers(file_name))))
+        t2 = time.time()
+        print(f"{t1-t0} seconds counting, {t2-t1} seconds streaming")
@@ -1,16 +1,50 @@
 
 
 import functools
+import heapq
 import random
+import re
 import sys
+from typing import NamedTuple
 
-molecules = [
+from profiling import profiled
+
+BENCHMARKS = ("part2_search",)
+
+Rule = tuple[str, str]
+
+example_molecules = [
     ("H","HO"),
     ("H","OH"),
     ("O","HH")
 ]
-start_string = "HOH"
-def replace_molecules(input_str: str) -> set[str]:
+example_start_string = "HOH"
+
+example_medicine_molecules = [
+    ("e", "H"),
+    ("e", "O"),
+    ("H", "HO"),
+    ("H", "OH"),
+    ("O", "HH")
+]
+example_medicine = "HOHOHO"
+
+def read_input(file_name: str) -> tuple[list[Rule], str]:
+    molecules = []
+    start_string = ""
+    with open(file_name, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if len(line) == 0:
+                continue
+            if line.find("=>") == -1:
+                start_string = line
+            else:
+                parts: list[str] = line.split("=>")
+                molecules.append((parts[0].strip(), parts[1].strip()))
+    return molecules, start_string
+
+def replace_molecules(input_str: str, molecules: list[Rule]) -> set[str]:
     ret = set()
     for m in molecules:
         start_find = 0
@@ -21,35 +55,9 @@ def replace_molecules(input_str: str) -> set[str]:
             found = input_str.find(m[0], start_find)
     return ret
 
-
-print(len(replace_molecules(start_string)))
-
-with open("input.txt", 'r') as f:
-    molecules.clear()
-    for line in f:
-        line = line.strip()
-        if len(line) == 0:
-            continue
-        if line.find("=>") == -1:
-            start_string = line
-        else:
-            parts: list[str] = line.split("=>")
-            molecules.append((parts[0].strip(), parts[1].strip()))
-
-print(len(replace_molecules(start_string)))
-
-
-molecules = [
-    ("e", "H"),
-    ("e", "O"),
-    ("H", "HO"),
-    ("H", "OH"),
-    ("O", "HH")
-]
-start_string = "e"
-
+@profiled()
 @functools.cache
-def replace_molecule(input_str: str, output_str: str, step: int) -> int:
+def replace_molecule(input_str: str, output_str: str, step: int, molecules: tuple[Rule, ...]) -> int:
     min_steps = sys.maxsize
     if input_str == output_str:
         return step
@@ -59,14 +67,15 @@ def replace_molecule(input_str: str, output_str: str, step: int) -> int:
         start_find = 0
         found = input_str.find(m[0], start_find)
         while found != -1:
-            min_steps = min(min_steps, replace_molecule(input_str[:found] + m[1] + input_str[found+len(m[0]):], output_str, step+1))
+            min_steps = min(min_steps, replace_molecule(input_str[:found] + m[1] + input_str[found+len(m[0]):], output_str, step+1, molecules))
             start_find = found+1
             found = input_str.find(m[0], start_find)
     return min_steps
 
 solution_found = False
+@profiled()
 @functools.cache
-def replace_molecule_backwards(input_str: str, output_str: str, step: int) -> int:
+def replace_molecule_backwards(input_str: str, output_str: str, step: int, molecules: tuple[Rule, ...]) -> int:
     #print(input_str)
     global solution_found
     min_steps = sys.maxsize
@@ -77,23 +86,24 @@ def replace_molecule_backwards(input_str: str, output_str: str, step: int) -> in
         start_find = 0
         found = input_str.find(m[1], start_find)
         while found != -1:
-            min_steps = min(min_steps, replace_molecule_backwards(input_str[:found] + m[0] + input_str[found+len(m[1]):], output_str, step+1))
+            min_steps = min(min_steps, replace_molecule_backwards(input_str[:found] + m[0] + input_str[found+len(m[1]):], output_str, step+1, molecules))
             if solution_found:
                 return min_steps
             start_find = found+1
             found = input_str.find(m[1], start_find)
     return min_steps
 
-def replace_molecule_backwards_dumb(input_str: str, output_str: str, step: int) -> int:
+def replace_molecule_backwards_dumb(input_str: str, output_str: str, step: int, molecules: list[Rule]) -> int:
     min_steps = sys.maxsize
     if input_str == output_str:
         return step
     for m in molecules:
-        if input_str.find(m[1]):
-            min_steps = min(min_steps, replace_molecule_backwards_dumb(input_str.replace(m[1], m[0]), output_str, step+1))
+        if m[1] in input_str:
+            min_steps = min(min_steps, replace_molecule_backwards_dumb(input_str.replace(m[1], m[0]), output_str, step+1, molecules))
     return min_steps
 
-def replace_molecule_iter(input_str: str, output_str: str) -> int:
+def replace_molecule_iter(input_str: str, output_str: str, molecules: list[Rule]) -> int:
+    molecules = molecules[:]
     step = 0
     while input_str != output_str:
         prev = input_str
@@ -107,37 +117,255 @@ def replace_molecule_iter(input_str: str, output_str: str) -> int:
             return sys.maxsize
     return step
 
+def fewest_steps(medicine: str, molecules: list[Rule]) -> int:
+    result = replace_molecule_iter(medicine, "e", molecules)
+    while(result == sys.maxsize):
+        result = replace_molecule_iter(medicine, "e", molecules)
+        #print(result)
+    return result
 
+class SearchResult(NamedTuple):
+    # The fewest steps lie in [lower, upper]; upper is None until a path is
+    # found and lower == upper once the answer is proven
+    lower: int
+    upper: int | None
+    states: int
 
+@profiled()
+def search_steps(medicine: str, molecules: list[Rule], start: str = "e", max_states: int = 1_000_000, weight: float = 1.0) -> SearchResult:
+    """
+    Best-first (A*) search from medicine back to start, undoing one
+    replacement per step.
 
-result = replace_molecule_iter("HOHOHO", "e")
-while(result == sys.maxsize):
-    result = replace_molecule_iter("HOHOHO", "e")
-    #print(result)
-print(result)
+    Every step changes the length by at most the largest rule growth, so
+    ceil(length gap / growth) steps are still needed: an admissible and
+    consistent heuristic. States are whole molecules and each is stored once
+    with its fewest known steps, so at most max_states molecules are held.
+    When the budget runs out the smallest g + h left in the queue is still a
+    lower bound. A weight above 1 expands greedier towards short molecules,
+    finds a path (an upper bound) much sooner but no longer proves it.
+    """
+    # Length change of each backwards step: len(lhs) - len(rhs)
+    deltas = [len(lhs) - len(rhs) for lhs, rhs in molecules]
+    shrink = max((-d for d in deltas), default=0)
+    grow = max(deltas, default=0)
+    # When start appears in no right-hand side it can only be the very last
+    # step back, so it is never put into the middle of a molecule
+    closed_start = not any(start in rhs for _, rhs in molecules)
 
-# solution_found = False
-# molecules.sort(key=lambda x: len(x[1]))
-# print(replace_molecule_backwards("HOHOHO","e", 0))
+    def heuristic(molecule: str) -> int | None:
+        gap = len(molecule) - len(start)
+        if gap > 0:
+            return -(-gap // shrink) if shrink > 0 else None
+        if gap < 0:
+            return -(gap // grow) if grow > 0 else None
+        return 0 if molecule == start else 1
 
-with open("input.txt", 'r') as f:
-    molecules.clear()
-    for line in f:
-        line = line.strip()
-        if len(line) == 0:
+    h = heuristic(medicine)
+    if h is None:
+        return SearchResult(sys.maxsize, None, 0)
+    best = {medicine: 0}
+    order = 0
+    queue = [(weight * h, 0, order, medicine, 0, h)]
+    upper = None
+    while queue:
+        if len(best) > max_states:
+            break
+        _, _, _, molecule, steps, h = heapq.heappop(queue)
+        if steps > best[molecule]:
             continue
-        if line.find("=>") == -1:
-            start_string = line
-        else:
-            parts: list[str] = line.split("=>")
-            molecules.append((parts[0].strip(), parts[1].strip()))
-
-result = replace_molecule_iter(start_string, "e")
-while(result == sys.maxsize):
-    result = replace_molecule_iter(start_string, "e")
-    #print(result)
-print(result)
-
-# solution_found = False
-# molecules.sort(key=lambda x: len(x[1]))
-# print(replace_molecule_backwards(start_string,"e", 0))
\ No newline at end of file
+        if molecule == start:
+            upper = steps
+            break
+        for lhs, rhs in molecules:
+            if closed_start and lhs == start and rhs != molecule:
+                continue
+            found = molecule.find(rhs)
+            while found != -1:
+                reduced = molecule[:found] + lhs + molecule[found+len(rhs):]
+                found = molecule.find(rhs, found+1)
+                if steps + 1 >= best.get(reduced, sys.maxsize):
+                    continue
+                h = heuristic(reduced)
+                if h is None:
+                    continue
+                best[reduced] = steps + 1
+                order += 1
+                heapq.heappush(queue, (steps + 1 + weight * h, -steps - 1, order, reduced, steps + 1, h))
+
+    # With weight 1 the first path popped is the fewest; otherwise (or when
+    # the budget ran out) the cheapest estimate still queued bounds it below
+    lower = min((steps + h for _, _, _, molecule, steps, h in queue if steps == best[molecule]), default=sys.maxsize)
+    if upper is not None:
+        lower = upper if weight <= 1 else min(lower, upper)
+    return SearchResult(lower, upper, len(best))
+
+# Element symbols: "e", a capital with its lowercase letters ("Ca", "Rn")
+TOKEN = re.compile(r"e|[A-Z][a-z]*|[a-z]+")
+
+def tokenize(molecule: str) -> list[str]:
+    return TOKEN.findall(molecule)
+
+# Rolling hash of a string: sum of ord(c) * BASE^(characters after c) mod
+# HASH_MODULUS (a Mersenne prime), so that spans can be combined
+HASH_MODULUS = (1 << 61) - 1
+HASH_BASE = 1_000_003
+
+def rule_trie(molecules: list[Rule]) -> dict:
+    # Nested {token: node} dicts over the tokenized left-hand sides; the
+    # replacements for a complete left-hand side are stored under None
+    root: dict = {}
+    for lhs, rhs in molecules:
+        node = root
+        for token in tokenize(lhs):
+            node = node.setdefault(token, {})
+        node.setdefault(None, []).append(rhs)
+    return root
+
+def find_replacements(tokens: list[str], trie: dict):
+    """Yield (first token, token after the match, replacement) for every rule match."""
+    for i in range(len(tokens)):
+        node = trie
+        j = i
+        while j < len(tokens) and tokens[j] in node:
+            node = node[tokens[j]]
+            j += 1
+            for rhs in node.get(None, ()):
+                yield i, j, rhs
+
+def count_replacements(input_str: str, molecules: list[Rule]) -> int:
+    """
+    Number of distinct molecules one replacement away, like
+    len(replace_molecules(...)) but matching whole element symbols.
+
+    Each candidate is prefix + replacement + suffix; its hash is combined
+    from prefix hashes of the molecule and the replacement's hash, so no
+    candidate string is built and the work is linear in the molecule
+    length plus the number of matches.
+    """
+    tokens = tokenize(input_str)
+    offsets = [0]
+    for token in tokens:
+        offsets.append(offsets[-1] + len(token))
+    length = offsets[-1]
+    longest = max((len(rhs) for _, rhs in molecules), default=0)
+    prefix = [0] * (length + 1)
+    power = [1] * (length + longest + 1)
+    for i, c in enumerate(input_str[:length]):
+        prefix[i+1] = (prefix[i] * HASH_BASE + ord(c)) % HASH_MODULUS
+    for i in range(1, len(power)):
+        power[i] = power[i-1] * HASH_BASE % HASH_MODULUS
+
+    replacement_hashes: dict[str, int] = {}
+    for _, rhs in molecules:
+        h = 0
+        for c in rhs:
+            h = (h * HASH_BASE + ord(c)) % HASH_MODULUS
+        replacement_hashes[rhs] = h
+
+    seen = set()
+    for i, j, rhs in find_replacements(tokens, rule_trie(molecules)):
+        start, end = offsets[i], offsets[j]
+        suffix_length = length - end
+        suffix = prefix[length] - prefix[end] * power[suffix_length]
+        h = (prefix[start] * power[len(rhs)] + replacement_hashes[rhs]) % HASH_MODULUS
+        seen.add((start + len(rhs) + suffix_length, (h * power[suffix_length] + suffix) % HASH_MODULUS))
+    return len(seen)
+
+@profiled()
+def min_steps(medicine: str, molecules: list[Rule], start: str = "e") -> int | None:
+    """
+    Fewest replacements turning start into medicine, or None if impossible.
+
+    A CYK chart parse of the tokenized medicine: best[i][j] maps each symbol
+    to the fewest steps deriving tokens i..j from it. Rules are split into
+    binary rules over helper symbols (the helpers cost 0, the original rule
+    costs 1), and single-token rules are relaxed inside each cell. Runtime
+    is bounded by O(tokens^3 * rules) and identical from run to run.
+    """
+    symbols: dict[object, int] = {}
+    def symbol(name: object) -> int:
+        return symbols.setdefault(name, len(symbols))
+
+    # (left, right) -> [(symbol, cost)]; unary: (symbol, child, cost)
+    binary: dict[tuple[int, int], list[tuple[int, int]]] = {}
+    unary: list[tuple[int, int, int]] = []
+    for lhs, rhs in molecules:
+        tokens = tokenize(rhs)
+        parent = symbol(lhs)
+        if len(tokens) == 1:
+            unary.append((parent, symbol(tokens[0]), 1))
+            continue
+        # X => A B C D becomes X -> A (B C D), (B C D) -> B (C D), (C D) -> C D
+        cost = 1
+        for i in range(len(tokens) - 2):
+            rest = symbol(tuple(tokens[i+1:]))
+            binary.setdefault((symbol(tokens[i]), rest), []).append((parent, cost))
+            parent, cost = rest, 0
+        binary.setdefault((symbol(tokens[-2]), symbol(tokens[-1])), []).append((parent, cost))
+
+    @profiled("day19.min_steps.relax_unary")
+    def relax_unary(cell: dict[int, int]):
+        changed = True
+        while changed:
+            changed = False
+            for parent, child, cost in unary:
+                if child in cell and cell[child] + cost < cell.get(parent, sys.maxsize):
+                    cell[parent] = cell[child] + cost
+                    changed = True
+
+    tokens = [symbol(token) for token in tokenize(medicine)]
+    n = len(tokens)
+    if n == 0:
+        return None
+    best: list[list[dict[int, int]]] = [[{} for _ in range(n + 1)] for _ in range(n)]
+    for i, token in enumerate(tokens):
+        best[i][i+1][token] = 0
+        relax_unary(best[i][i+1])
+    for length in range(2, n + 1):
+        for i in range(n - length + 1):
+            j = i + length
+            cell = best[i][j]
+            for k in range(i + 1, j):
+                left = best[i][k]
+                right = best[k][j]
+                if not left or not right:
+                    continue
+                for b, left_steps in left.items():
+                    for c, right_steps in right.items():
+                        for parent, cost in binary.get((b, c), ()):
+                            steps = left_steps + right_steps + cost
+                            if steps < cell.get(parent, sys.maxsize):
+                                cell[parent] = steps
+            if cell:
+                relax_unary(cell)
+    return best[0][n].get(symbols.get(start, -1))
+
+def part1(file_name: str) -> int:
+    molecules, start_string = read_input(file_name)
+    return count_replacements(start_string, molecules)
+
+def part2(file_name: str) -> int | None:
+    molecules, start_string = read_input(file_name)
+    return min_steps(start_string, molecules)
+
+def part2_search(file_name: str, max_states: int = 100_000) -> SearchResult:
+    molecules, start_string = read_input(file_name)
+    return search_steps(start_string, molecules, max_states=max_states)
+
+
+if __name__ == "__main__":
+    print(count_replacements(example_start_string, example_molecules))
+    print(part1("input.txt"))
+
+    print(min_steps(example_medicine, example_medicine_molecules))
+    print(search_steps(example_medicine, example_medicine_molecules))
+
+    # solution_found = False
+    # print(replace_molecule_backwards(example_medicine, "e", 0, tuple(sorted(example_medicine_molecules, key=lambda x: len(x[1])))))
+
+    print(part2("input.txt"))
+
+    # molecules, start_string = read_input("input.txt")
+    # solution_found = False
+    # print(replace_molecule_backwards(start_string, "e", 0, tuple(sorted(molecules, key=lambda x: len(x[1])))))
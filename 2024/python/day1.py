@@ -1,41 +1,65 @@
+from collections import Counter
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
-def part1(file_name):
+BENCHMARKS = ("part1_python", "part2_python")
+
+
+def read_lists(file_name):
     with open(file_name, 'r') as f:
-        list1 = []
-        list2 = []
-        for line in f.readlines():
-            nums = line.split()
-            list1.append(int(nums[0]))
-            list2.append(int(nums[1]))
-        list1.sort()
-        list2.sort()
-        distance = 0
-        for i in range(len(list1)):
-            distance += abs(list1[i]-list2[i])
-        return distance
-    
+        nums = f.read().split()
+    return [int(x) for x in nums[0::2]], [int(x) for x in nums[1::2]]
+
+def distance(list1, list2):
+    return sum(abs(a - b) for a, b in zip(sorted(list1), sorted(list2)))
+
+def similarity(list1, list2):
+    # Counter returns 0 for missing keys without inserting them
+    counts = Counter(list2)
+    return sum(num * counts[num] for num in list1)
+
+def read_arrays(file_name):
+    # sep=" " makes numpy parse any run of whitespace, newlines included
+    nums = np.fromfile(file_name, dtype=np.int64, sep=" ").reshape(-1, 2)
+    return np.sort(nums[:, 0]), np.sort(nums[:, 1])
+
+def distance_numpy(list1, list2):
+    return int(np.abs(list1 - list2).sum())
+
+def similarity_numpy(list1, list2):
+    values, counts = np.unique(list2, return_counts=True)
+    if len(values) == 0:
+        return 0
+    indices = np.minimum(np.searchsorted(values, list1), len(values) - 1)
+    found = values[indices] == list1
+    return int((list1[found] * counts[indices[found]]).sum())
+
+def solve(file_name):
+    if np is not None:
+        list1, list2 = read_arrays(file_name)
+        return distance_numpy(list1, list2), similarity_numpy(list1, list2)
+    list1, list2 = read_lists(file_name)
+    return distance(list1, list2), similarity(list1, list2)
+
+def part1_python(file_name):
+    return distance(*read_lists(file_name))
+
+def part2_python(file_name):
+    return similarity(*read_lists(file_name))
+
+def part1(file_name):
+    if np is None:
+        return part1_python(file_name)
+    return distance_numpy(*read_arrays(file_name))
+
 def part2(file_name):
-    with open(file_name, 'r') as f:
-        list1 = []
-        list2 = []
-        for line in f.readlines():
-            nums = line.split()
-            list1.append(int(nums[0]))
-            list2.append(int(nums[1]))
-        list1.sort()
-        list2.sort()
-        similarity = 0
-        for i in range(len(list1)):
-            local_sim = 0
-            for j in range(len(list2)):
-                if list2[j] > list1[i]:
-                    break
-                if list2[j] == list1[i]:
-                    local_sim += 1
-            similarity += local_sim * list1[i]
-        return similarity
-    
+    if np is None:
+        return part2_python(file_name)
+    return similarity_numpy(*read_arrays(file_name))
+
 if __name__ == "__main__":
-    print(part1("inputs/day1/input.txt"))
-    print(part2("inputs/day1/input.txt"))
\ No newline at end of file
+    for result in solve("inputs/day1/input.txt"):
+        print(result)
@@ -1,7 +1,20 @@
 import functools
+import marshal
+import os
 import time
-from typing import Dict
+from collections import Counter, OrderedDict, defaultdict
+from typing import Dict, NamedTuple
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from profiling import profiled
+
+BENCHMARKS = ("part2_score", "part2_score_cached")
+
+@profiled()
 @functools.cache
 def score(num, iterations):
     if iterations == 0:
@@ -15,6 +28,7 @@ def score(num, iterations):
         return score(num*2024, iterations-1)
 
 cache = {}
+@profiled(cache=cache)
 def score_cached(num, iterations):
     key = (num,iterations)
     #print(f"cache {cache}")
@@ -30,17 +44,499 @@ def score_cached(num, iterations):
             cache[key] = score_cached(num*2024, iterations-1)
     return cache[key]
 
-def day11(iterations, start):
-    with open("inputs/day11/input.txt", "r") as f:
-        result = 0
-        for line in f.readlines():
-            nums = [int(x) for x in line.split()]
-            for num in nums:
-                result += score_cached(num, iterations)
+def blink(num):
+    # Same rules as score_cached, splitting digits arithmetically
+    if num == 0:
+        return (1,)
+    digits = 1
+    power = 10
+    while power <= num:
+        power *= 10
+        digits += 1
+    if digits % 2 == 0:
+        half = 10 ** (digits // 2)
+        return (num // half, num % half)
+    return (num * 2024,)
+
+class Evolution(NamedTuple):
+    stones: int
+    counts: Dict[int, int]
+    peak_distinct: int
+    cache: functools._CacheInfo
+
+@profiled()
+def evolve(stones, iterations, cache_size=4096, modulus=None):
+    """
+    Blink a multiset of stones, keeping one {stone: count} dict per blink.
+
+    Memory is bounded by the number of distinct stones alive at once (the
+    peak is reported) and by cache_size transitions, and nothing outlives
+    the call. Pass cache_size=None for an unbounded per-run cache, and a
+    modulus to keep the counts small when only the residue is wanted.
+    """
+    transition = profiled("day11.evolve.transition")(functools.lru_cache(maxsize=cache_size)(blink))
+    counts = Counter(stones)
+    peak = len(counts)
+    for _ in range(iterations):
+        next_counts = defaultdict(int)
+        for stone, count in counts.items():
+            for new_stone in transition(stone):
+                next_counts[new_stone] += count
+        counts = next_counts
+        if modulus is not None:
+            counts = {stone: count % modulus for stone, count in counts.items()}
+        peak = max(peak, len(counts))
+    total = sum(counts.values())
+    if modulus is not None:
+        total %= modulus
+    return Evolution(total, dict(counts), peak, transition.cache_info())
+
+class CacheStats(NamedTuple):
+    hits: int
+    misses: int
+    evictions: int
+    stones: int
+    depth: int
+
+class BlinkCache:
+    """
+    Memo of stone -> [stones after 0 blinks, after 1 blink, ...].
+
+    Unlike the global score_cached dict it can be sized (max_stones keeps the
+    most recently used vectors), cleared, inspected through stats(), and saved
+    to / warm started from a file. Vectors are only ever extended, so once a
+    depth has been reached every query at or below it is a lookup per stone.
+    """
+    MAGIC = b"day11-blink-cache-1\n"
+
+    def __init__(self, max_stones=None, path=None):
+        self.max_stones = max_stones
+        self.path = path
+        self.vectors = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if path is not None and os.path.exists(path):
+            self.load(path)
+
+    def __len__(self):
+        return len(self.vectors)
+
+    def stats(self):
+        depth = max((len(v) - 1 for v in self.vectors.values()), default=0)
+        return CacheStats(self.hits, self.misses, self.evictions, len(self.vectors), depth)
+
+    def clear(self):
+        self.vectors.clear()
+        self.hits = self.misses = self.evictions = 0
+
+    def count(self, stones, iterations):
+        return self.count_depths(stones, (iterations,))[iterations]
+
+    def count_depths(self, stones, depths):
+        # Every depth is read off the same per-stone vectors
+        deepest = max(depths, default=0)
+        missing = []
+        for stone in stones:
+            vector = self.vectors.get(stone)
+            if vector is not None and len(vector) > deepest:
+                self.hits += 1
+            else:
+                self.misses += 1
+                missing.append(stone)
+        if missing:
+            self.extend(missing, deepest)
+        result = {depth: 0 for depth in depths}
+        for stone in stones:
+            vector = self.vectors[stone]
+            for depth in result:
+                result[depth] += vector[depth]
+            self.vectors.move_to_end(stone)
+        self.trim()
+        return result
+
+    def extend(self, stones, iterations):
+        # Breadth first from the queried stones: a stone first seen after
+        # `level` blinks needs its vector up to iterations - level.
+        needed = {stone: iterations for stone in stones}
+        children = {}
+        frontier = list(needed)
+        for depth in range(iterations - 1, -1, -1):
+            next_frontier = []
+            for stone in frontier:
+                children[stone] = blink(stone)
+                for child in children[stone]:
+                    if child not in needed:
+                        needed[child] = depth
+                        next_frontier.append(child)
+            frontier = next_frontier
+        # Fill the vectors one depth at a time, children are always one ahead.
+        vectors = self.vectors
+        for stone in needed:
+            if stone not in vectors:
+                vectors[stone] = [1]
+        for depth in range(1, iterations + 1):
+            for stone, depth_needed in needed.items():
+                vector = vectors[stone]
+                if depth_needed >= depth and len(vector) == depth:
+                    vector.append(sum(vectors[child][depth - 1] for child in children[stone]))
+
+    def trim(self):
+        if self.max_stones is None:
+            return
+        while len(self.vectors) > self.max_stones:
+            self.vectors.popitem(last=False)
+            self.evictions += 1
+
+    def save(self, path=None):
+        with open(path or self.path, "wb") as f:
+            f.write(self.MAGIC)
+            marshal.dump(dict(self.vectors), f)
+
+    def load(self, path):
+        with open(path, "rb") as f:
+            if f.read(len(self.MAGIC)) != self.MAGIC:
+                raise ValueError(f"{path} is not a day11 blink cache")
+            self.vectors.update(marshal.load(f))
+        self.trim()
+
+class TransitionTable(NamedTuple):
+    stones: list
+    index: Dict[int, int]
+    # children[i] are the indices of the stones stones[i] turns into
+    children: list
+
+def transition_table(stones):
+    # Every stone reachable from the start is visited once: the set is closed
+    # under blink(), so one blink is a fixed (sparse) integer matrix over it.
+    table = TransitionTable([], {}, [])
+    for stone in stones:
+        if stone not in table.index:
+            table.index[stone] = len(table.stones)
+            table.stones.append(stone)
+    i = 0
+    while i < len(table.stones):
+        kids = []
+        for child in blink(table.stones[i]):
+            if child not in table.index:
+                table.index[child] = len(table.stones)
+                table.stones.append(child)
+            kids.append(table.index[child])
+        table.children.append(kids)
+        i += 1
+    return table
+
+def sparse_multiply(a, b, modulus=None):
+    # Rows are {column: count} dicts, rows of a select and scale rows of b
+    result = []
+    for row in a:
+        out = defaultdict(int)
+        for k, count in row.items():
+            for j, other in b[k].items():
+                out[j] += count * other
+        if modulus is not None:
+            out = {j: value % modulus for j, value in out.items()}
+        result.append(dict(out))
+    return result
+
+def dense_limb_bits(n, modulus):
+    # Width of the pieces a dense int64 product is split into, or None when
+    # the dense NumPy path does not apply. With n < 2^nb terms and entries
+    # below 2^mb, pieces of 62 - nb - mb bits keep every sum of products in
+    # range; the pieces are recombined modulo modulus, which needs m^2 < 2^63.
+    if np is None or modulus is None or n > DENSE_LIMIT or modulus >= 1 << 31:
+        return None
+    bits = min(62 - n.bit_length() - (modulus - 1).bit_length(), (modulus - 1).bit_length())
+    return bits if bits > 0 else None
+
+# Dense n x n powers only pay off while they are small; past this the sparse
+# rows (or the recurrence in fast_forward) are used.
+DENSE_LIMIT = 1024
+
+def numpy_multiply(a, b, modulus, bits):
+    # a @ b % modulus for int64 matrices with entries below modulus, one
+    # bits-wide piece of b at a time so that no partial product overflows
+    result = np.zeros((a.shape[0], b.shape[1]), dtype=np.int64)
+    mask = (1 << bits) - 1
+    for shift in range(0, (modulus - 1).bit_length(), bits):
+        part = a @ ((b >> shift) & mask) % modulus
+        result = (result + part * pow(2, shift, modulus)) % modulus
+    return result
+
+def matrix_count(stones, iterations, modulus=None):
+    """
+    Number of stones after `iterations` blinks by exponentiation by squaring
+    of the transition matrix, O(n^3 log iterations) for n reachable stones.
+
+    Small matrices with a modulus below 2^31 are dense int64 NumPy arrays,
+    multiplied in pieces so nothing overflows. Otherwise rows are sparse
+    dicts of Python ints. Exact counts grow by about a digit every 5-6
+    blinks, so for very deep queries pass a modulus.
+
+    The powers fill in after a few squarings, so past DENSE_LIMIT reachable
+    stones (the puzzle input reaches 3844) each one is ~n^3 pure Python
+    work and only a handful of blinks is practical: use fast_forward, which
+    picks recurrence_count for a prime modulus, or refuses.
+    """
+    table = transition_table(stones)
+    n = len(table.stones)
+    start = Counter(table.index[stone] for stone in stones)
+    bits = dense_limb_bits(n, modulus)
+    if bits is not None:
+        vector = np.zeros((1, n), dtype=np.int64)
+        for i, count in start.items():
+            vector[0, i] = count % modulus
+        power = np.zeros((n, n), dtype=np.int64)
+        for i, kids in enumerate(table.children):
+            for j in kids:
+                power[i, j] += 1
+        multiply = functools.partial(numpy_multiply, bits=bits)
+    else:
+        vector = [dict(start)]
+        power = [Counter(kids) for kids in table.children]
+        multiply = sparse_multiply
+    while iterations:
+        if iterations & 1:
+            vector = multiply(vector, power, modulus)
+        iterations >>= 1
+        if iterations:
+            power = multiply(power, power, modulus)
+    total = int(vector.sum()) if bits is not None else sum(vector[0].values())
+    return total if modulus is None else total % modulus
+
+def is_prime(num):
+    if num < 2:
+        return False
+    factor = 2
+    while factor * factor <= num:
+        if num % factor == 0:
+            return False
+        factor += 1
+    return True
+
+def stone_totals(table, stones, terms, modulus):
+    # Number of stones (mod modulus) after 0, 1, ... terms - 1 blinks, one
+    # sparse matrix-vector product per blink. bincount adds in float64, which
+    # is exact as long as no stone has 2^53 / modulus parents.
+    parents = np.repeat(np.arange(len(table.stones)), [len(kids) for kids in table.children])
+    children = np.array([j for kids in table.children for j in kids], dtype=np.int64)
+    vector = np.zeros(len(table.stones), dtype=np.int64)
+    for stone in stones:
+        vector[table.index[stone]] += 1
+    totals = np.empty(terms, dtype=np.int64)
+    for i in range(terms):
+        totals[i] = vector.sum() % modulus
+        vector = np.bincount(children, weights=vector[parents], minlength=len(vector)).astype(np.int64) % modulus
+    return totals
+
+def berlekamp_massey(sequence, modulus):
+    # Shortest c with sequence[k] + c[1] sequence[k-1] + ... + c[L] sequence[k-L]
+    # == 0 (mod a prime modulus below 2^31) for every k >= L. Products of two
+    # residues stay below 2^62.
+    size = len(sequence) + 1
+    current = np.zeros(size, dtype=np.int64)
+    current[0] = 1
+    previous = current.copy()
+    length, gap, last = 0, 1, 1
+    for i in range(len(sequence)):
+        discrepancy = int(sequence[i])
+        if length:
+            discrepancy += int((current[1:length+1] * sequence[i-length:i][::-1] % modulus).sum())
+        discrepancy %= modulus
+        if discrepancy == 0:
+            gap += 1
+            continue
+        scale = discrepancy * pow(last, -1, modulus) % modulus
+        update = (current[gap:] - scale * previous[:size-gap]) % modulus
+        if 2 * length <= i:
+            previous = current.copy()
+            length, last, gap = i + 1 - length, discrepancy, 1
+        else:
+            gap += 1
+        current[len(current)-len(update):] = update
+    return current[1:length+1]
+
+def polynomial_mulmod(a, b, reduction, modulus):
+    # a * b mod (x^L - reduction . (1, x, ..., x^(L-1))) and modulus. The
+    # convolutions run on 16-bit halves so that every sum fits in int64.
+    a_low, a_high = a & 0xFFFF, a >> 16
+    b_low, b_high = b & 0xFFFF, b >> 16
+    high = np.convolve(a_high, b_high) % modulus
+    middle = (np.convolve(a_high, b_low) + np.convolve(a_low, b_high)) % modulus
+    low = np.convolve(a_low, b_low) % modulus
+    product = ((high * 65536 % modulus + middle) % modulus * 65536 % modulus + low) % modulus
+    length = len(reduction)
+    for i in range(len(product) - 1, length - 1, -1):
+        top = product[i]
+        if top:
+            product[i-length:i] = (product[i-length:i] + top * reduction) % modulus
+    return product[:length]
+
+def recurrence_count(stones, iterations, modulus):
+    """
+    Number of stones (mod a prime modulus below 2^31) after `iterations`
+    blinks, in time logarithmic in iterations.
+
+    The totals after k blinks satisfy a linear recurrence of order at most
+    n, the number of reachable stones (Cayley-Hamilton on the transition
+    matrix). 2n totals pin down the shortest one with Berlekamp-Massey, and
+    x^iterations is then reduced modulo its characteristic polynomial by
+    squaring, so the matrix itself is never raised to a power. On the puzzle
+    input n is 3844 and the recurrence has order 1375.
+    """
+    table = transition_table(stones)
+    terms = min(2 * len(table.stones), iterations + 1)
+    totals = stone_totals(table, stones, terms, modulus)
+    if iterations < terms:
+        return int(totals[iterations])
+    # x^L == reduction . (1, x, ..., x^(L-1))
+    reduction = -berlekamp_massey(totals, modulus)[::-1] % modulus
+    length = len(reduction)
+    if length == 0:
+        return 0
+    result = np.zeros(length, dtype=np.int64)
+    result[0] = 1
+    base = np.zeros(length, dtype=np.int64)
+    if length == 1:
+        base[0] = reduction[0]
+    else:
+        base[1] = 1
+    while iterations:
+        if iterations & 1:
+            result = polynomial_mulmod(result, base, reduction, modulus)
+        iterations >>= 1
+        if iterations:
+            base = polynomial_mulmod(base, base, reduction, modulus)
+    return int((result * totals[:length] % modulus).sum() % modulus)
+
+# Exact counts gain about 0.64 bits per blink; adding them costs about this
+# many more blinks' worth per blink (measured, 110s for 20000 exact blinks)
+BIG_INT_BLINKS = 31250
+
+def fast_forward(stones, iterations, modulus=None, max_cost=10 ** 8):
+    """
+    Number of stones after `iterations` blinks by the cheapest of evolve,
+    matrix_count and recurrence_count.
+
+    Only a prime modulus below 2^31 (with NumPy) gets the logarithmic
+    recurrence. Exact counts, or any other modulus, fall back to linear
+    blinking or matrix powers, whose cost grows with the reachable set;
+    rather than run for hours a ValueError is raised when the estimate is
+    above max_cost (pass None to run anyway).
+    """
+    # Estimated cost of each method in units of one evolve() update (about
+    # a microsecond); the per-operation factors were measured on the puzzle
+    # input. Blinking touches at most n stones per blink, the matrix powers
+    # fill in after a few squarings so each one is ~n^3 multiply-adds, and
+    # the recurrence is ~n^2 vectorized work per bit of iterations. Without
+    # a modulus the numbers themselves grow with every blink.
+    n = len(transition_table(stones).stones)
+    bits = max(iterations.bit_length(), 1)
+    growth = 1 if modulus is not None else 1 + iterations / BIG_INT_BLINKS
+    costs = {evolve: n * iterations * growth}
+    limb_bits = dense_limb_bits(n, modulus)
+    if limb_bits is not None:
+        limbs = -(-(modulus - 1).bit_length() // limb_bits)
+        costs[matrix_count] = bits * n ** 3 * limbs / 1000
+    else:
+        costs[matrix_count] = bits * n ** 3 / 8 * growth
+    if np is not None and modulus is not None and modulus < 1 << 31 and is_prime(modulus):
+        costs[recurrence_count] = n * n * (bits + 1) / 256
+    method = min(costs, key=costs.get)
+    if max_cost is not None and costs[method] > max_cost:
+        raise ValueError(f"{iterations} blinks over {n} reachable stones would take about "
+                         f"{costs[method] / 1e6:.0f}s; pass a prime modulus below 2^31 for a logarithmic jump")
+    if method is evolve:
+        return evolve(stones, iterations, modulus=modulus).stones
+    return method(stones, iterations, modulus)
+
+class QueryResult(NamedTuple):
+    stones: tuple
+    # depth -> number of stones after that many blinks
+    counts: Dict[int, int]
+    seconds: float
+
+class BatchResult(NamedTuple):
+    results: list
+    sweep_seconds: float
+    cache: CacheStats
+
+def blink_batch(queries, cache=None):
+    """
+    Answer many (stones, depths) queries with one forward sweep.
+
+    The distinct stones of every query are pushed together to the deepest
+    requested depth in a BlinkCache (stones shared between queries, or
+    reached from several of them, are only expanded once); each query is
+    then a sum over per-stone count vectors for all of its depths.
+    """
+    cache = BlinkCache() if cache is None else cache
+    queries = [(tuple(stones), tuple(sorted(set(depths)))) for stones, depths in queries]
+    deepest = max((max(depths, default=0) for _, depths in queries), default=0)
+    start = time.perf_counter()
+    cache.count_depths({stone for stones, _ in queries for stone in stones}, (deepest,))
+    sweep_seconds = time.perf_counter() - start
+    results = []
+    for stones, depths in queries:
+        start = time.perf_counter()
+        counts = cache.count_depths(stones, depths)
+        results.append(QueryResult(stones, counts, time.perf_counter() - start))
+    return BatchResult(results, sweep_seconds, cache.stats())
+
+def read_stones(file_name):
+    with open(file_name, "r") as f:
+        return [int(x) for x in f.read().split()]
+
+def day11(iterations, file_name, cache=None):
+    if cache is not None:
+        return cache.count(read_stones(file_name), iterations)
+    return evolve(read_stones(file_name), iterations).stones
+
+def part2_score(file_name):
+    # The original recursions, each starting from an empty memo
+    score.cache_clear()
+    return sum(score(stone, 75) for stone in read_stones(file_name))
+
+def part2_score_cached(file_name):
+    cache.clear()
+    return sum(score_cached(stone, 75) for stone in read_stones(file_name))
+
+def part1(file_name):
+    return day11(25, file_name)
+
+def part2(file_name):
+    return day11(75, file_name)
+
+if __name__ == "__main__":
+    stones = read_stones("inputs/day11/input.txt")
+    for iterations in (25, 75, 500):
+        start = time.time()
+        result = evolve(stones, iterations)
         end = time.time()
-        print(f"{result} stones after {iterations} blinks in {end-start}s")
+        print(f"{result.stones} stones after {iterations} blinks in {end-start}s")
+        print(f"  peak {result.peak_distinct} distinct stones, {result.cache}")
+
+    cache = BlinkCache()
+    for iterations in (25, 75, 75, 40):
+        start = time.time()
+        result = cache.count(stones, iterations)
+        end = time.time()
+        print(f"{result} stones after {iterations} blinks in {end-start}s from {cache.stats()}")
+
+    batch = blink_batch([(stones, range(0, 76, 5)), ([125, 17], (6, 25, 75)), ([0], (10, 100))])
+    print(f"Sweep in {batch.sweep_seconds}s, {batch.cache}")
+    for query in batch.results:
+        print(f"  {query.stones} in {query.seconds}s: {query.counts}")
 
-start = time.time()
-day11(25,start)
-start = time.time()
-day11(75,start)
\ No newline at end of file
+    modulus = 1_000_000_007
+    for iterations in (1, 2, 5, 8):
+        assert matrix_count(stones, iterations, modulus) == evolve(stones, iterations, modulus=modulus).stones
+    # past 2n blinks, so the recurrence is actually used
+    for iterations in (10000,):
+        assert recurrence_count(stones, iterations, modulus) == evolve(stones, iterations, modulus=modulus).stones
+    for test_stones in (stones, read_stones("inputs/day11/test.txt")):
+        for iterations in (75, 10 ** 6):
+            start = time.time()
+            result = fast_forward(test_stones, iterations, modulus)
+            end = time.time()
+            print(f"{result} (mod 1e9+7) stones after {iterations} blinks from {test_stones} in {end-start}s")
@@ -1,18 +1,56 @@
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+BENCHMARKS = ("part1_batch", "part2_batch")
 
 def build_report(line, tolerance):
     nums = [int(s) for s in line.split()]
     res = check_report(nums)
     if res == 0 and tolerance:
-        for i in range(len(nums)):
-            copy = nums[:]
-            copy.pop(i)
-            if check_report(copy) == 1:
-                return 1
-        return 0
+        # tolerance is the number of levels the dampener may remove (True == 1)
+        return dampen_report(nums, int(tolerance))
     else:
         return res
 
 
+def dampen_report(nums, tolerance=1):
+    for increasing in (True, False):
+        if min_removals(nums, increasing, tolerance) <= tolerance:
+            return 1
+    return 0
+
+
+def min_removals(nums, increasing, limit):
+    # Fewest levels to remove so nums is safe in the given direction, or any
+    # value above limit when that is not possible within limit removals.
+    # removed[i] is the answer for nums[:i+1] when nums[i] is kept. Gaps wider
+    # than limit are never worth considering, so only the previous limit+1
+    # levels are looked at: O(n * limit) with no copies of the report.
+    n = len(nums)
+    removed = []
+    dead = 0
+    for i in range(n):
+        num = nums[i]
+        fewest = i if i <= limit else n
+        for j in range(i - limit - 1 if i > limit else 0, i):
+            r = removed[j] + i - j - 1
+            if r < fewest:
+                step = num - nums[j] if increasing else nums[j] - num
+                if 0 < step < 4:
+                    fewest = r
+        if fewest > limit:
+            dead += 1
+            if dead > limit:
+                # a safe report keeps at least one of any limit+1 neighbours
+                return n
+        else:
+            dead = 0
+        removed.append(fewest)
+    return min((removed[i] + n - 1 - i for i in range(max(0, n - limit - 1), n)), default=0)
+
+
 def check_report(nums):
     prev_num = None
     increasing = None
@@ -50,8 +88,71 @@ def part2(file_name):
         for line in f.readlines():
             safe_reports += build_report(line,True)
         return safe_reports
-        
-    
+
+
+def read_reports(file_name):
+    # All reports in one zero-padded (reports x max levels) array plus lengths
+    with open(file_name, 'r') as f:
+        rows = [line.split() for line in f.read().splitlines() if line.strip()]
+    lengths = np.array([len(row) for row in rows], dtype=np.int64)
+    levels = np.zeros((len(rows), max(lengths, default=0)), dtype=np.int64)
+    if len(rows):
+        report = np.repeat(np.arange(len(rows)), lengths)
+        column = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        levels[report, column] = np.array([x for row in rows for x in row], dtype=np.int64)
+    return levels, lengths
+
+
+def batch_verdicts(levels, lengths, tolerance):
+    count, width = levels.shape
+    if width < 2:
+        return np.ones(count, dtype=bool)
+    # Padding past the end of a report never makes it unsafe
+    diffs = np.diff(levels, axis=1)
+    padding = np.arange(width - 1) >= (lengths - 1)[:, None]
+    # Differences across a removed level: levels[r + 1] - levels[r - 1]
+    bridges = levels[:, 2:] - levels[:, :-2]
+    bridge_padding = np.arange(1, width - 1) >= (lengths - 1)[:, None]
+    ones = np.ones((count, 1), dtype=bool)
+    verdicts = np.zeros(count, dtype=bool)
+    for sign in (1, -1):
+        ok = ((sign * diffs >= 1) & (sign * diffs <= 3)) | padding
+        # prefix[:, i] / suffix[:, i]: all differences before / from i are ok
+        prefix = np.hstack((ones, np.logical_and.accumulate(ok, axis=1)))
+        suffix = np.hstack((np.logical_and.accumulate(ok[:, ::-1], axis=1)[:, ::-1], ones))
+        verdicts |= prefix[:, -1]
+        if tolerance:
+            # Removing level r needs diffs before r-1, diffs from r+1 and the bridge to be ok
+            bridge_ok = ((sign * bridges >= 1) & (sign * bridges <= 3)) | bridge_padding
+            bridge_ok = np.hstack((ones, bridge_ok, ones))
+            before = np.hstack((ones, prefix[:, :-1]))
+            after = np.hstack((suffix[:, 1:], ones))
+            removable = before & after & bridge_ok & (np.arange(width) < lengths[:, None])
+            verdicts |= removable.any(axis=1)
+    return verdicts
+
+
+def check_reports(file_name, tolerance=0):
+    """
+    Per-report safety verdicts for the whole file, and how many are safe.
+
+    With NumPy the reports are checked together from first differences of a
+    padded array for tolerance 0 and 1; otherwise (or for larger tolerances)
+    each report goes through build_report.
+    """
+    if np is None or tolerance > 1:
+        with open(file_name, 'r') as f:
+            verdicts = [bool(build_report(line, tolerance)) for line in f.read().splitlines() if line.strip()]
+        return verdicts, sum(verdicts)
+    verdicts = batch_verdicts(*read_reports(file_name), tolerance)
+    return verdicts.tolist(), int(verdicts.sum())
+
+def part1_batch(file_name):
+    return check_reports(file_name, 0)[1]
+
+def part2_batch(file_name):
+    return check_reports(file_name, 1)[1]
+
 
 if __name__ == "__main__":
     print(part1("inputs/day2/input.txt"))
@@ -1,87 +1,210 @@
 
+import os
+import tempfile
 import time
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import islice
+from typing import Callable, NamedTuple
 
+BENCHMARKS = ("part2_parallel",)
 
-def part1_rec_setup(target, nums):
-    if (part1_rec(target, nums[0], nums[1:])):
-        return target
-    else:
-        return 0
-    
-
-def part1_rec(target, current, nums):
-    if len(nums) == 0:
-        if target == current:
-            return True
-        else:
-            return False
-    return part1_rec(target, current + nums[0], nums[1:]) or part1_rec(target, current * nums[0], nums[1:])
-
-def part2_rec_setup(target, nums):
-    if (part2_rec(target, nums[0], nums[1:])):
+
+# Sentinel returned by an undo when any value works before the operator
+# (e.g. undoing "* 0" from 0), so the rest of the equation needs no search.
+ANY = object()
+
+class Operator(NamedTuple):
+    symbol: str
+    # apply(current, operand) -> new value
+    apply: Callable[[int, int], int]
+    # undo(result, operand) -> value before the operator, None if no whole
+    # value gives result, or ANY
+    undo: Callable[[int, int], object]
+    # Never turns non-negative inputs into a negative value
+    non_negative: bool
+
+def digits_power(num):
+    # Smallest power of 10 greater than num, i.e. the shift used by concat
+    power = 10
+    while power <= num:
+        power *= 10
+    return power
+
+def add(a, b):
+    return a + b
+
+def undo_add(result, b):
+    return result - b
+
+def sub(a, b):
+    return a - b
+
+def undo_sub(result, b):
+    return result + b
+
+def mul(a, b):
+    return a * b
+
+def undo_mul(result, b):
+    if b == 0:
+        return ANY if result == 0 else None
+    return result // b if result % b == 0 else None
+
+def concat(a, b):
+    return a * digits_power(b) + b
+
+def undo_concat(result, b):
+    power = digits_power(b)
+    return result // power if result % power == b else None
+
+ADD = Operator("+", add, undo_add, True)
+SUB = Operator("-", sub, undo_sub, False)
+MUL = Operator("*", mul, undo_mul, True)
+CONCAT = Operator("||", concat, undo_concat, True)
+
+# Operators are tried in order; putting the ones whose inverse rarely exists
+# first lets most dead branches stop before the always-invertible "+".
+PART1_OPERATORS = (MUL, ADD)
+PART2_OPERATORS = (MUL, CONCAT, ADD)
+
+def find_operators(target, nums, operators):
+    """
+    Operators that make nums evaluate (left to right) to target, or None.
+
+    The search runs backwards from target, undoing one operand at a time, so
+    an operator is only followed when its inverse exists. If every operator
+    keeps non-negative values non-negative and so do the operands, negative
+    intermediate targets are dropped as well.
+    """
+    prune_negative = all(op.non_negative for op in operators) and min(nums) >= 0
+    return undo_operators(target, nums, len(nums) - 1, operators, prune_negative)
+
+def undo_operators(target, nums, i, operators, prune_negative):
+    num = nums[i]
+    if i == 0:
+        return [] if target == num else None
+    if prune_negative and target < 0:
+        return None
+    for op in operators:
+        previous = op.undo(target, num)
+        if previous is None:
+            continue
+        if previous is ANY:
+            return [operators[0]] * (i - 1) + [op]
+        found = undo_operators(previous, nums, i - 1, operators, prune_negative)
+        if found is not None:
+            found.append(op)
+            return found
+    return None
+
+def evaluate(nums, ops):
+    value = nums[0]
+    for op, num in zip(ops, nums[1:]):
+        value = op.apply(value, num)
+    return value
+
+def expression(nums, ops):
+    terms = [str(nums[0])]
+    for op, num in zip(ops, nums[1:]):
+        terms.append(f"{op.symbol} {num}")
+    return " ".join(terms)
+
+def calibration_value(target, nums, operators=PART2_OPERATORS):
+    if find_operators(target, nums, operators) is not None:
         return target
     else:
         return 0
-    
-
-def part2_rec(target, current, nums):
-    if len(nums) == 0:
-        if target == current:
-            return True
-        else:
-            return False
-    return part2_rec(target, current + nums[0], nums[1:]) or part2_rec(target, current * nums[0], nums[1:]) or part2_rec(target, int(str(current) + str(nums[0])), nums[1:])
-
-def part1_iterative(target, nums):
-    not_found = True
-    for i in range(0, (2**(len(nums)-1))):
-        answer = nums[0]
-        for j in range(1,len(nums)):
-            if i & (1 << (len(nums)-1-j)) > 0:
-                answer *= nums[j]
-            else:
-                answer += nums[j]
-        if answer == target:
-            not_found = False
-            break
-    if not_found:
-        #print(f"no answer for {target}: {nums}")
-        return 0
-    else:
-        #print(f"found answer for {target}: {nums}")
-        return target
 
-def part1():
-    with open("inputs/day7/input.txt", "r") as f:
-        result = 0
-        start = time.time()
-        for line in f.read().splitlines():
-            strings = line.split(" ")
-            target = int(strings[0][:-1])
-            nums = [int(x) for x in strings[1:]]
-            result += part1_iterative(target,nums)
-        end = time.time()
-        print(f"Calibration result {result} in {end-start}s")
-    with open("inputs/day7/input.txt", "r") as f:
-        result = 0
+def parse_equation(line):
+    target, _, nums = line.partition(":")
+    return int(target), array("q", map(int, nums.split()))
+
+def parse_equations(lines):
+    # Blank lines (a trailing newline, a gap) are skipped on every path
+    return (parse_equation(line) for line in lines if line.strip())
+
+def read_equations(file_name):
+    return list(stream_equations(file_name))
+
+def stream_equations(file_name):
+    # One equation in memory at a time, however large the file is
+    with open(file_name, "r") as f:
+        yield from parse_equations(f)
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+def calibrate_equations(equations, solver):
+    result = 0
+    for target, nums in equations:
+        result += solver(target,nums)
+    return result
+
+def calibrate_lines(lines, solver):
+    return calibrate_equations(parse_equations(lines), solver)
+
+def calibrate(file_name, solver):
+    return calibrate_equations(stream_equations(file_name), solver)
+
+def calibrate_parallel(file_name, solver, workers=None, chunk_size=64):
+    # Lines are independent: ship them to the pool in chunks (one pickle per
+    # chunk rather than per line) and add up the partial sums. Addition is
+    # order independent, so the result is the same as calibrate(). At most a
+    # couple of chunks per worker are in flight, so memory stays bounded.
+    workers = workers or os.cpu_count()
+    result = 0
+    with open(file_name, "r") as f, ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for chunk in chunked(f, chunk_size):
+            pending.append(pool.submit(calibrate_lines, chunk, solver))
+            if len(pending) >= 2 * workers:
+                result += pending.popleft().result()
+        for future in pending:
+            result += future.result()
+    return result
+
+def scaling_benchmark(file_name, solver, max_workers=None, chunk_size=64):
+    lines = sum(1 for _ in stream_equations(file_name))
+    for workers in range(1, (max_workers or os.cpu_count()) + 1):
         start = time.time()
-        for line in f.read().splitlines():
-            strings = line.split(" ")
-            target = int(strings[0][:-1])
-            nums = [int(x) for x in strings[1:]]
-            result += part1_rec_setup(target,nums)
+        result = calibrate_parallel(file_name, solver, workers, chunk_size)
         end = time.time()
-        print(f"Calibration result {result} in {end-start}s")
-    with open("inputs/day7/input.txt", "r") as f:
-        result = 0
+        print(f"{workers} workers: {result} at {lines/(end-start):.0f} equations/s")
+
+def part1(file_name):
+    return calibrate(file_name, partial(calibration_value, operators=PART1_OPERATORS))
+
+def part2(file_name):
+    return calibrate(file_name, partial(calibration_value, operators=PART2_OPERATORS))
+
+def part2_parallel(file_name, workers=None):
+    return calibrate_parallel(file_name, partial(calibration_value, operators=PART2_OPERATORS), workers)
+
+if __name__ == "__main__":
+    equations = read_equations("inputs/day7/input.txt")
+    for label, operators in (("", PART1_OPERATORS), (" with concat", PART2_OPERATORS)):
         start = time.time()
-        for line in f.read().splitlines():
-            strings = line.split(" ")
-            target = int(strings[0][:-1])
-            nums = [int(x) for x in strings[1:]]
-            result += part2_rec_setup(target,nums)
+        result = calibrate_equations(equations, partial(calibration_value, operators=operators))
         end = time.time()
-        print(f"Calibration result with concat {result} in {end-start}s")
+        print(f"Calibration result{label} {result} in {end-start}s")
 
-if __name__ == "__main__":
-    part1()
+    target, nums = equations[0]
+    ops = find_operators(target, nums, PART2_OPERATORS)
+    if ops is not None:
+        print(f"{target} = {expression(nums, ops)}")
+
+    # Blank lines reach the parallel path as raw lines, not parsed equations
+    with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as f:
+        f.write("190: 10 19\n\n3267: 81 40 27\n\n")
+    try:
+        assert part2_parallel(f.name, 2) == part2(f.name) == 3457
+    finally:
+        os.remove(f.name)
+
+    print("Scaling")
+    scaling_benchmark("inputs/day7/input.txt", partial(calibration_value, operators=PART2_OPERATORS), max(os.cpu_count(), 4))
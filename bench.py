@@ -0,0 +1,287 @@
+"""
+Benchmark runner for every solver in the repo.
+
+A solver is any ``2024/python/dayN.py`` or ``2015/dayN/dayN.py`` module that
+defines top-level ``part1``/``part2`` functions taking an input file name.
+Modules can list extra entry points with the same signature in a module-level
+``BENCHMARKS`` tuple of function names (e.g. alternative implementations); an
+item can also be a (name, input glob) pair to run that entry point on the
+matching inputs only, e.g. a slow legacy implementation on the small input.
+
+Discovery is static (the module source is parsed, not imported), and every
+(solver, entry point, input) case runs in a fresh process so peak RSS is
+measured per case and caches do not leak between cases.
+
+    python bench.py                          # everything, table to stdout
+    python bench.py day7 "2015/*" -i input.txt -o bench_output.json
+    python bench.py --compare old.json -o new.json
+"""
+import argparse
+import ast
+import contextlib
+import importlib.util
+import io
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from fnmatch import fnmatch
+from pathlib import Path
+from typing import NamedTuple
+
+ROOT = Path(__file__).resolve().parent
+SOLVER_GLOBS = ("2024/python/day*.py", "2015/day*/day*.py")
+ENTRY_POINTS = ("part1", "part2")
+
+
+class Solver(NamedTuple):
+    name: str
+    path: Path
+    # (function name, glob its input file names must match)
+    entry_points: tuple[tuple[str, str], ...]
+    inputs: tuple[Path, ...]
+
+
+def entry_points(path: Path) -> tuple[tuple[str, str], ...]:
+    tree = ast.parse(path.read_text(), filename=str(path))
+    defined = {node.name for node in tree.body if isinstance(node, ast.FunctionDef)}
+    names = [(name, "*") for name in ENTRY_POINTS if name in defined]
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and any(
+            isinstance(t, ast.Name) and t.id == "BENCHMARKS" for t in node.targets
+        ):
+            for item in ast.literal_eval(node.value):
+                name, pattern = (item, "*") if isinstance(item, str) else item
+                if name in defined:
+                    names.append((name, pattern))
+    return tuple(names)
+
+
+def solver_cases(solver: Solver):
+    for entry_point, pattern in solver.entry_points:
+        for input_path in solver.inputs:
+            if fnmatch(input_path.name, pattern):
+                yield entry_point, input_path
+
+
+def working_dir(path: Path) -> Path:
+    # 2024 solvers are run from the year directory ("inputs/dayN/..."),
+    # 2015 solvers from their own directory ("input.txt").
+    return path.parent.parent if path.parent.name == "python" else path.parent
+
+
+def input_files(path: Path) -> tuple[Path, ...]:
+    if path.parent.name == "python":
+        folder = working_dir(path) / "inputs" / path.stem
+    else:
+        folder = path.parent
+    return tuple(sorted(folder.glob("*.txt")))
+
+
+def discover(patterns=(), input_pattern="*.txt") -> list[Solver]:
+    solvers = []
+    for solver_glob in SOLVER_GLOBS:
+        for path in sorted(ROOT.glob(solver_glob)):
+            name = str(path.relative_to(ROOT).with_suffix(""))
+            if patterns and not any(p == path.stem or fnmatch(name, p) for p in patterns):
+                continue
+            parts = entry_points(path)
+            inputs = tuple(i for i in input_files(path) if fnmatch(i.name, input_pattern))
+            if parts and inputs:
+                solvers.append(Solver(name, path, parts, inputs))
+    return solvers
+
+
+def load_module(path: Path):
+    # Registered under its own name (one solver per worker process) so that
+    # solvers using process pools can pickle their functions by reference.
+    spec = importlib.util.spec_from_file_location(path.stem, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.path.insert(0, str(path.parent))
+    sys.modules[path.stem] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def percentile(samples, q):
+    if len(samples) == 1:
+        return samples[0]
+    return statistics.quantiles(samples, n=100, method="inclusive")[q - 1]
+
+
+def run_case(path: str, entry_point: str, input_path: str, warmup: int, trials: int, profile: bool = False) -> dict:
+    """Executed in a fresh worker process, see ``bench``."""
+    path = Path(path)
+    os.chdir(working_dir(path))
+    if profile:
+        # Read by profiling.py when the solver imports it
+        os.environ["AOC_PROFILE"] = "1"
+    with contextlib.redirect_stdout(io.StringIO()):
+        t0 = time.perf_counter_ns()
+        module = load_module(path)
+        import_ns = time.perf_counter_ns() - t0
+        solve = getattr(module, entry_point)
+
+        # Profiled on its own cold run, before warmup fills the caches
+        profiling = sys.modules.get("profiling")
+        if profile and profiling is not None:
+            solve(input_path)
+            profile_report = profiling.report()
+
+        for _ in range(warmup):
+            solve(input_path)
+
+        samples = []
+        for _ in range(trials):
+            t0 = time.perf_counter_ns()
+            result = solve(input_path)
+            samples.append(time.perf_counter_ns() - t0)
+
+        # Allocation tracing slows the solver down, so it gets its own run.
+        tracemalloc.start()
+        blocks = sys.getallocatedblocks()
+        solve(input_path)
+        blocks = sys.getallocatedblocks() - blocks
+        _, alloc_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    case = {
+        "result": repr(result),
+        "import_ns": import_ns,
+        "trials": trials,
+        "median_ns": int(statistics.median(samples)),
+        "p95_ns": int(percentile(samples, 95)),
+        "min_ns": min(samples),
+        "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "alloc_peak_bytes": alloc_peak,
+        "alloc_blocks_retained": blocks,
+    }
+    if profile:
+        case["profile"] = profile_report if profile and profiling is not None else {}
+    return case
+
+
+def bench(solvers, warmup=1, trials=5, profile=False):
+    context = multiprocessing.get_context("spawn")
+    for solver in solvers:
+        for entry_point, input_path in solver_cases(solver):
+            case = {
+                "solver": solver.name,
+                "entry_point": entry_point,
+                "input": str(input_path.relative_to(ROOT)),
+            }
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                future = pool.submit(run_case, str(solver.path), entry_point, str(input_path), warmup, trials, profile)
+                try:
+                    case.update(future.result())
+                except Exception as e:
+                    case["error"] = f"{type(e).__name__}: {e}"
+            yield case
+
+
+def case_key(case):
+    return case["solver"], case["entry_point"], case["input"]
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def format_ns(ns):
+    for unit, scale in (("s", 1e9), ("ms", 1e6), ("us", 1e3)):
+        if ns >= scale:
+            return f"{ns / scale:.2f}{unit}"
+    return f"{ns}ns"
+
+
+def print_case(case, baseline=None):
+    label = f"{case['solver']}.{case['entry_point']} [{Path(case['input']).name}]"
+    if "error" in case:
+        print(f"{label:<50} ERROR {case['error']}", flush=True)
+        return
+    line = (
+        f"{label:<50} median {format_ns(case['median_ns']):>9}  p95 {format_ns(case['p95_ns']):>9}"
+        f"  rss {case['max_rss_kb'] // 1024:>5}MiB  alloc {case['alloc_peak_bytes'] // 1024:>8}KiB"
+    )
+    old = (baseline or {}).get(case_key(case))
+    if old and "median_ns" in old:
+        line += f"  {old['median_ns'] / max(case['median_ns'], 1):.2f}x vs baseline"
+        if old["result"] != case["result"]:
+            line += f"  RESULT CHANGED ({old['result']} -> {case['result']})"
+    print(line, flush=True)
+    for name, stats in case.get("profile", {}).items():
+        if stats["calls"]:
+            print(f"    {name}: " + ", ".join(f"{k} {v:.4g}" if isinstance(v, float) else f"{k} {v}" for k, v in stats.items()), flush=True)
+
+
+def positive_int(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {value}")
+    return number
+
+
+def non_negative_int(value):
+    number = int(value)
+    if number < 0:
+        raise argparse.ArgumentTypeError(f"must be at least 0, got {value}")
+    return number
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("solvers", nargs="*", help="only run these solvers, by module name (day7) or glob (2015/*)")
+    parser.add_argument("-i", "--input", default="*.txt", help="glob for input file names (default: *.txt)")
+    parser.add_argument("-w", "--warmup", type=non_negative_int, default=1)
+    parser.add_argument("-n", "--trials", type=positive_int, default=5)
+    parser.add_argument("-o", "--output", help="write the JSON report here")
+    parser.add_argument("-c", "--compare", help="JSON report of a previous run to diff against")
+    parser.add_argument("-p", "--profile", action="store_true", help="record profiling.py counters on a cold run")
+    parser.add_argument("-l", "--list", action="store_true", help="list the discovered cases and exit")
+    args = parser.parse_args(argv)
+
+    solvers = discover(args.solvers, args.input)
+    if args.list:
+        for solver in solvers:
+            for entry_point, input_path in solver_cases(solver):
+                print(f"{solver.name}.{entry_point} {input_path.relative_to(ROOT)}")
+        return
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = {case_key(case): case for case in json.load(f)["cases"]}
+
+    cases = []
+    for case in bench(solvers, args.warmup, args.trials, args.profile):
+        print_case(case, baseline)
+        cases.append(case)
+
+    if args.output:
+        report = {
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "warmup": args.warmup,
+            "trials": args.trials,
+            "profile": args.profile,
+            "cases": cases,
+        }
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Call/cache/depth/time counters for the memoized recursions in the solvers.
+
+    @profiled()                   # above functools.cache / lru_cache
+    @functools.cache
+    def score(num, iterations): ...
+
+    @profiled(cache=cache)        # hand-rolled dict (or any sized) cache
+    def score_cached(num, iterations): ...
+
+Profiling is decided once, when the decorator runs: unless the AOC_PROFILE
+environment variable is set the function is returned untouched, so there is
+no overhead at all when it is off. bench.py --profile turns it on and puts
+report() into each case of the benchmark report.
+
+Solvers import it directly (bench.py runs from the repo root, so it is on the
+path); standalone scripts need the repo root on the path:
+
+    PYTHONPATH=../.. AOC_PROFILE=1 python day17.py
+
+A script that has to run without this file can fall back to a no-op:
+
+    try:
+        from profiling import profiled
+    except ImportError:
+        def profiled(*args, **kwargs):
+            return lambda func: func
+"""
+import functools
+import os
+import sys
+import time
+
+ENABLED = bool(os.environ.get("AOC_PROFILE"))
+
+_stats = {}
+
+
+class Stats:
+    def __init__(self):
+        self.calls = 0
+        self.hits = 0
+        self.misses = 0
+        self.depth = 0
+        self.max_depth = 0
+        self.seconds = 0.0
+        self.cache = None
+
+    def as_dict(self):
+        report = {"calls": self.calls, "max_depth": self.max_depth, "seconds": self.seconds}
+        if self.cache is not None:
+            report["hits"] = self.hits
+            report["misses"] = self.misses
+            entries, size = self.cache()
+            report["cache_entries"] = entries
+            if size is not None:
+                report["cache_bytes"] = size
+        return report
+
+
+def cache_size(func, cache):
+    # (entries, shallow bytes) of the cache behind func; functools caches do
+    # not expose their dict, so only the entry count is known for them.
+    if cache is not None:
+        return lambda: (len(cache), sys.getsizeof(cache))
+    if hasattr(func, "cache_info"):
+        return lambda: (func.cache_info().currsize, None)
+    return None
+
+
+def profiled(name=None, cache=None):
+    def decorate(func):
+        if not ENABLED:
+            return func
+        stats = _stats.setdefault(name or f"{func.__module__}.{func.__qualname__}", Stats())
+        stats.cache = cache_size(func, cache)
+        cache_info = getattr(func, "cache_info", None)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            stats.calls += 1
+            stats.depth += 1
+            stats.max_depth = max(stats.max_depth, stats.depth)
+            # Only the outermost call is measured, nested calls are part of it
+            outermost = stats.depth == 1
+            if outermost:
+                if cache_info is not None:
+                    before = cache_info()
+                elif cache is not None:
+                    before = len(cache)
+                start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                stats.depth -= 1
+                if outermost:
+                    stats.seconds += time.perf_counter() - start
+                    # Recursive calls go through this wrapper too, so the
+                    # cache counters are taken once for the whole recursion.
+                    if cache_info is not None:
+                        after = cache_info()
+                        stats.hits += after.hits - before.hits
+                        stats.misses += after.misses - before.misses
+                    elif cache is not None:
+                        # Every miss stores one new entry, every other call hit
+                        stats.misses += len(cache) - before
+                        stats.hits = stats.calls - stats.misses
+
+        for attribute in ("cache_info", "cache_clear"):
+            if hasattr(func, attribute):
+                setattr(wrapper, attribute, getattr(func, attribute))
+        return wrapper
+    return decorate
+
+
+def report():
+    return {name: stats.as_dict() for name, stats in _stats.items()}
+
+
+def reset():
+    for stats in _stats.values():
+        stats.calls = stats.hits = stats.misses = stats.max_depth = 0
+        stats.seconds = 0.0
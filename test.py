@@ -1,6 +1,12 @@
+import argparse
 import itertools
-import matplotlib
-from matplotlib import pyplot as plt
+from bisect import bisect_left, bisect_right
+from typing import NamedTuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 class Rectangle:
     def __init__(self, xy1, xy2):
@@ -34,53 +40,199 @@ class Segment:
                      self.bottom < r.top and
                      r.bottom < self.top )
 
-data = [[int(x) for x in s.split(',')] for s in open('2025/inputs/day9/input.txt').readlines()]
-
-# Create all rectangles, sort by decreasing area.
-# We want to find the first rectangle of the list
-# that is fully inside the contour.
-rectangles = []
-for xy1, xy2 in itertools.combinations(data, 2):
-    # Assume the rectangle we'll find has distinct xmin/xmax and ymin/ymax
-    if xy1[0] == xy2[0] or xy1[1] == xy2[1]:
-        continue
-    rectangles.append(Rectangle(xy1, xy2))
-
-# Create all segments, sort by decreasing length
-segments = []
-xy_prev = data[-1]
-for xy in data:
-    segments.append(Segment(xy_prev, xy))
-    xy_prev = xy
-
-# Delete rectangles that intersect segments
-# Start with the largest segments, they have more
-# chances to intersect rectangles.
-for s in sorted(segments, key = lambda s : s.length, reverse = True):
-    toPop = []
-    for i, r in enumerate(rectangles):
-        if s.intersectsRectangle(r):
-            toPop.append(i)
-    for i in toPop[::-1]:
-        rectangles.pop(i)
-
-# Show remaining rectangles to user (in reverse area order),
-# so that they can select the largest rectangle that's inside
-# the shape (for my input, it's the first one, but Eric could
-# have been sneaky and make is so the largest rectangle that
-# doesn't intersect the contour is outside of it).
-plt.plot(
-    [x[0] for x in data] + [data[0][0]],
-    [x[1] for x in data] + [data[0][1]])
-plt_rect = matplotlib.patches.Rectangle((0, 0), 0, 0, color = 'red')
-plt.gca().add_patch(plt_rect)
-for r in sorted(rectangles, key = lambda r : r.area, reverse = True):
-    plt_rect.set_xy((r.left, r.bottom))
-    plt_rect.set_width(r.right - r.left)
-    plt_rect.set_height(r.top - r.bottom)
-    plt.show(block = False)
-    print(f'Rectangle area: {r.area}')
-    print(f'Top Left: {r.left},{r.top}\n Bottom Right: {r.right},{r.bottom}')
-    print('Presse enter to check next rectangle, q + enter to exit')
-    if 'q' == input():
-        break
+class SegmentIndex:
+    # Segments sorted by their fixed coordinate (y for horizontal ones, x for
+    # vertical ones). Only a segment whose fixed coordinate lies strictly
+    # between the rectangle's sides can cross it, and those are a contiguous
+    # slice of the sorted lists, found with two bisects per direction.
+    def __init__(self, segments):
+        self.horizontal = sorted((s for s in segments if s.isHorizontal), key = lambda s : s.top)
+        self.vertical = sorted((s for s in segments if not s.isHorizontal), key = lambda s : s.left)
+        self.ys = [s.top for s in self.horizontal]
+        self.xs = [s.left for s in self.vertical]
+
+    def candidates(self, r):
+        yield from self.horizontal[bisect_right(self.ys, r.bottom):bisect_left(self.ys, r.top)]
+        yield from self.vertical[bisect_right(self.xs, r.left):bisect_left(self.xs, r.right)]
+
+    def intersectsRectangle(self, r):
+        return any(s.intersectsRectangle(r) for s in self.candidates(r))
+
+    def containsPoint(self, x, y):
+        # Ray cast towards +x: count the vertical segments it crosses. Pass
+        # half-integer coordinates so the ray never touches a vertex.
+        return sum(s.bottom < y < s.top for s in self.vertical[bisect_right(self.xs, x):]) % 2 == 1
+
+def read_data(file_name):
+    with open(file_name) as f:
+        return [[int(x) for x in s.split(',')] for s in f if s.strip()]
+
+def make_rectangles(data):
+    rectangles = []
+    for xy1, xy2 in itertools.combinations(data, 2):
+        # Assume the rectangle we'll find has distinct xmin/xmax and ymin/ymax
+        if xy1[0] == xy2[0] or xy1[1] == xy2[1]:
+            continue
+        rectangles.append(Rectangle(xy1, xy2))
+    return rectangles
+
+def make_segments(data):
+    segments = []
+    xy_prev = data[-1]
+    for xy in data:
+        segments.append(Segment(xy_prev, xy))
+        xy_prev = xy
+    return segments
+
+def filter_rectangles(rectangles, segments):
+    # Keep the rectangles no segment crosses. Each one is only tested against
+    # the segments the index returns for it, and the survivors are collected
+    # into a new list rather than popping the others out one by one.
+    index = SegmentIndex(segments)
+    return [r for r in rectangles if not index.intersectsRectangle(r)]
+
+# The same filter over parallel int64 arrays: one entry per candidate
+# rectangle (or segment) instead of one object each.
+class Rectangles(NamedTuple):
+    left: "np.ndarray"
+    right: "np.ndarray"
+    bottom: "np.ndarray"
+    top: "np.ndarray"
+    area: "np.ndarray"
+
+class Segments(NamedTuple):
+    left: "np.ndarray"
+    right: "np.ndarray"
+    bottom: "np.ndarray"
+    top: "np.ndarray"
+
+def rectangle_arrays(points, start, stop):
+    # Candidates from the pairs (i, j) with start <= i < stop and i < j only,
+    # so callers can go through all pairs one block of rows at a time
+    n = len(points)
+    i = np.repeat(np.arange(start, stop), n)
+    j = np.tile(np.arange(n), stop - start)
+    # Same assumption as make_rectangles: distinct xmin/xmax and ymin/ymax
+    keep = (i < j) & (points[i, 0] != points[j, 0]) & (points[i, 1] != points[j, 1])
+    p, q = points[i[keep]], points[j[keep]]
+    left, right = np.minimum(p[:, 0], q[:, 0]), np.maximum(p[:, 0], q[:, 0])
+    bottom, top = np.minimum(p[:, 1], q[:, 1]), np.maximum(p[:, 1], q[:, 1])
+    return Rectangles(left, right, bottom, top, (right - left + 1) * (top - bottom + 1))
+
+def segment_arrays(data):
+    points = np.asarray(data, dtype = np.int64)
+    previous = np.roll(points, 1, axis = 0)
+    if np.any((points[:, 0] != previous[:, 0]) & (points[:, 1] != previous[:, 1])):
+        raise ValueError('Segment is neither horizontal nor vertical')
+    left, right = np.minimum(points[:, 0], previous[:, 0]), np.maximum(points[:, 0], previous[:, 0])
+    bottom, top = np.minimum(points[:, 1], previous[:, 1]), np.maximum(points[:, 1], previous[:, 1])
+    return Segments(left, right, bottom, top)
+
+def contour_counts(segments):
+    # The contour drawn on a grid of the distinct coordinates, doubled so
+    # that index 2i is coordinate i and 2i+1 the open gap after it. A segment
+    # crosses a rectangle exactly when one of its cells lies strictly inside
+    # the rectangle's doubled bounds, so a 2D prefix sum of the drawn cells
+    # answers Segment.intersectsRectangle for all segments at once.
+    xs = np.unique(np.concatenate((segments.left, segments.right)))
+    ys = np.unique(np.concatenate((segments.bottom, segments.top)))
+    left = 2 * np.searchsorted(xs, segments.left)
+    right = 2 * np.searchsorted(xs, segments.right)
+    bottom = 2 * np.searchsorted(ys, segments.bottom)
+    top = 2 * np.searchsorted(ys, segments.top)
+    # Difference array: +1/-1 at the corners of each drawn block
+    # The grid has (2 * distinct xs) * (2 * distinct ys) cells, int32 is
+    # plenty for both the overlaps and the prefix sums and halves the memory
+    drawn = np.zeros((2 * len(ys) + 1, 2 * len(xs) + 1), dtype = np.int32)
+    np.add.at(drawn, (bottom, left), 1)
+    np.add.at(drawn, (bottom, right + 1), -1)
+    np.add.at(drawn, (top + 1, left), -1)
+    np.add.at(drawn, (top + 1, right + 1), 1)
+    np.cumsum(drawn, axis = 0, out = drawn)
+    np.cumsum(drawn, axis = 1, out = drawn)
+    # counts[i, j] is the number of drawn cells in rows < i and columns < j
+    counts = np.zeros((drawn.shape[0] + 1, drawn.shape[1] + 1), dtype = np.int32)
+    np.greater(drawn, 0, out = counts[1:, 1:])
+    del drawn
+    np.cumsum(counts, axis = 0, out = counts)
+    np.cumsum(counts, axis = 1, out = counts)
+    return xs, ys, counts
+
+def filter_arrays(rectangles, contour):
+    # One O(1) prefix sum query per rectangle
+    xs, ys, counts = contour
+    # Doubled interior: columns 2*left+1 .. 2*right-1, same for rows
+    x0 = 2 * np.searchsorted(xs, rectangles.left) + 1
+    x1 = 2 * np.searchsorted(xs, rectangles.right)
+    y0 = 2 * np.searchsorted(ys, rectangles.bottom) + 1
+    y1 = 2 * np.searchsorted(ys, rectangles.top)
+    keep = counts[y1, x1] - counts[y0, x1] - counts[y1, x0] + counts[y0, x0] == 0
+    return Rectangles(*(column[keep] for column in rectangles))
+
+def surviving_arrays(data, max_pairs = 1 << 20):
+    # Candidates are built and filtered a block of rows at a time, at most
+    # about max_pairs pairs per block, so memory is bounded by the block and
+    # the survivors rather than by all n^2 / 2 pairs
+    points = np.asarray(data, dtype = np.int64)
+    contour = contour_counts(segment_arrays(data))
+    rows = max(1, max_pairs // max(1, len(points)))
+    blocks = [filter_arrays(rectangle_arrays(points, start, min(start + rows, len(points))), contour)
+              for start in range(0, len(points), rows)]
+    return Rectangles(*(np.concatenate(columns) for columns in zip(*blocks)))
+
+def surviving_rectangles(data):
+    # Rectangles no segment crosses, as Rectangle objects; only the survivors
+    # are turned into objects when NumPy is available
+    if np is None:
+        return filter_rectangles(make_rectangles(data), make_segments(data))
+    survivors = surviving_arrays(data)
+    return [Rectangle((l, b), (r, t)) for l, r, b, t in
+            zip(*(column.tolist() for column in survivors[:4]))]
+
+def largest_contained(data):
+    # No segment crosses a surviving rectangle, so its interior is either
+    # all inside or all outside the contour (for my input the largest one is
+    # inside, but Eric could have been sneaky and put it outside). One
+    # interior point tells which, no need to look at the plot.
+    index = SegmentIndex(make_segments(data))
+    for r in sorted(surviving_rectangles(data), key = lambda r : r.area, reverse = True):
+        if index.containsPoint(r.left + 0.5, r.bottom + 0.5):
+            return r
+    return None
+
+def render(data, rectangles):
+    # Show remaining rectangles to user (in reverse area order)
+    from matplotlib import patches, pyplot as plt
+
+    plt.plot(
+        [x[0] for x in data] + [data[0][0]],
+        [x[1] for x in data] + [data[0][1]])
+    plt_rect = patches.Rectangle((0, 0), 0, 0, color = 'red')
+    plt.gca().add_patch(plt_rect)
+    for r in rectangles:
+        plt_rect.set_xy((r.left, r.bottom))
+        plt_rect.set_width(r.right - r.left)
+        plt_rect.set_height(r.top - r.bottom)
+        plt.show(block = False)
+        print(f'Rectangle area: {r.area}')
+        print(f'Top Left: {r.left},{r.top}\n Bottom Right: {r.right},{r.bottom}')
+        print('Presse enter to check next rectangle, q + enter to exit')
+        if 'q' == input():
+            break
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("input", nargs = "?", default = '2025/inputs/day9/input.txt')
+    parser.add_argument("--render", action = "store_true", help = "step through the candidates with matplotlib")
+    args = parser.parse_args()
+    data = read_data(args.input)
+
+    r = largest_contained(data)
+    if r is None:
+        print('No rectangle inside the contour')
+    else:
+        print(f'Rectangle area: {r.area}')
+        print(f'Top Left: {r.left},{r.top}\n Bottom Right: {r.right},{r.bottom}')
+
+    if args.render:
+        render(data, sorted(surviving_rectangles(data), key = lambda r : r.area, reverse = True))
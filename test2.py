@@ -1,8 +1,7 @@
 import sys
-from bisect import bisect
-from collections import defaultdict
 from typing import NamedTuple
-from itertools import combinations, pairwise, chain
+from heapq import heapify, heappop, heappush
+from itertools import pairwise, chain
 
 
 class Point(NamedTuple):
@@ -60,45 +59,67 @@ with open("inputs/day9/input.txt") as f:
         reds.append(Point(x, y))
 
 
-greens = []
-for p0, p1 in pairwise(chain(reds, [reds[0]])):  # chain to close the shape
-    for point in generate_straight_line(p0, p1):
-        greens.append(point)
-
-decreasing_red_pairs = sorted(
-    ((compute_area(*pair), pair) for pair in combinations(reds, r=2)),
-    reverse=True,
-)
+def green_tiles(reds):
+    # Only needed for draw(), part 2 works from the red tiles alone
+    greens = []
+    for p0, p1 in pairwise(chain(reds, [reds[0]])):  # chain to close the shape
+        for point in generate_straight_line(p0, p1):
+            greens.append(point)
+    return greens
+
+def decreasing_red_pairs(reds):
+    # Yields (area, pair) from the largest area down without building all the pairs.
+    # With the points sorted by x, each point walks its partners on the right from
+    # the furthest one in. The width shrinks as it goes, so the width times the
+    # tallest height to any point on the right bounds the area of every partner not
+    # seen yet. The heap holds one such bound per point plus the pairs already
+    # scored, and a pair comes out once no bound left in the heap is larger, so the
+    # walk only goes as deep as the areas we actually ask for.
+    points = sorted(reds)
+    n = len(points)
+
+    # heights[i]: tallest rectangle from points[i] to any point on its right
+    heights = [0] * n
+    y_min = y_max = None
+    for i in range(n - 1, -1, -1):
+        p = points[i]
+        if y_min is not None:
+            heights[i] = 1 + max(p.y - y_min, y_max - p.y)
+            y_min, y_max = min(y_min, p.y), max(y_max, p.y)
+        else:
+            y_min = y_max = p.y
+
+    # (-area, is_bound, i, j): on equal areas the scored pairs come out first
+    heap = [(-(1 + points[n - 1].x - points[i].x) * heights[i], True, i, n - 1) for i in range(n - 1)]
+    heapify(heap)
+    while heap:
+        area, is_bound, i, j = heappop(heap)
+        if not is_bound:
+            yield -area, (points[i], points[j])
+            continue
+        heappush(heap, (-compute_area(points[i], points[j]), False, i, j))
+        if j - 1 > i:
+            heappush(heap, (-(1 + points[j - 1].x - points[i].x) * heights[i], True, i, j - 1))
 
 
 # PART 1
 #
-largest_area, _ = decreasing_red_pairs[0]
+largest_area, _ = next(decreasing_red_pairs(reds))
 print(largest_area)
 
 
 # PART 2
 #
-# We maintain lists of all x and y coordinates for each fixed y and x coordinate,
-# to allow for fast checking of whether a line crosses the interior of the shape.
-# The algorithm for this is to do a binary search to find the insertion points of
-# the endpoints of the line segment, and if these differ, then there is at least
-# one point in between, meaning the line crosses the boundary.
-y_lists = defaultdict(list)
-x_lists = defaultdict(list)
-
-for point in chain(reds, greens):
-    y_lists[point.x].append(point.y)
-    x_lists[point.y].append(point.x)
-
-for y_list in y_lists.values():
-    y_list.sort()
-for x_list in x_lists.values():
-    x_list.sort()
-
-
-# The next part is actually NOT necessary to solve any AoC input, as they do not contain
-# such adverse cases. Look at this example:
+# We compress the plane onto the distinct x and y coordinates of the red tiles, with
+# one extra column (row) for the gap between two consecutive coordinates. Every cell
+# of that grid is either entirely on the boundary, entirely inside or entirely
+# outside the shape, since no line starts or ends within a cell. We then count the
+# outside cells with a 2D prefix sum, so testing a rectangle is a single O(1) lookup
+# however far apart its corners are.
+#
+# Gaps between adjacent coordinates hold no tiles at all, they are kept (so that
+# coordinate i is always column 2 * i) but never count as outside. This takes care of
+# "adjacent edges" without any special casing. Look at this example:
 #
 # RGGGGGGR..........
 # G......G..........
@@ -113,102 +134,102 @@ for x_list in x_lists.values():
 # RGGRRGGGGGGGGGGGGR
 #
 # Here, you can see there are "adjacent edges" that create situations where a line
-# could cross the boundary twice without actually "leaving" the shape. To avoid dealing
-# with such cases, we filter out adjacent coordinates, so that they are not counted
-# as a crossing of the boundary.
+# could cross the boundary twice without actually "leaving" the shape.
 #
-def remove_adjacent(coords):
-    filtered = []
-    prev = None
-    for c in coords:
-        if prev is None or c - prev > 1:
-            filtered.append(c)
-        elif filtered:  # c "cancels" previous crossing
-            filtered.pop()
-        prev = c
-    return filtered
-
-
-for x in y_lists:
-    y_lists[x] = remove_adjacent(y_lists[x])
-for y in x_lists:
-    x_lists[y] = remove_adjacent(x_lists[y])
+def compress(coords):
+    # Sorted distinct coordinates, index of each one, and the size of every grid
+    # column: 1 for a coordinate, the number of tiles in between for a gap
+    values = sorted(set(coords))
+    index = {c: 2 * i for i, c in enumerate(values)}
+    sizes = []
+    for c0, c1 in pairwise(values):
+        sizes += [1, c1 - c0 - 1]
+    sizes.append(1)
+    return index, sizes
+
+
+def outside_counts(reds):
+    x_index, x_sizes = compress(p.x for p in reds)
+    y_index, y_sizes = compress(p.y for p in reds)
+    width, height = len(x_sizes), len(y_sizes)
+
+    # Boundary cells, and where a ray going right along each row crosses a vertical
+    # line. Rows use the half-open span [y0, y1) of a line, as if the ray ran just
+    # above the row, so a ray running along a horizontal line is handled correctly.
+    boundary = [[False] * width for _ in range(height)]
+    crossings = [[False] * width for _ in range(height)]
+    for p0, p1 in pairwise(chain(reds, [reds[0]])):  # chain to close the shape
+        x0, x1 = sorted((x_index[p0.x], x_index[p1.x]))
+        y0, y1 = sorted((y_index[p0.y], y_index[p1.y]))
+        for row in range(y0, y1 + 1):
+            for column in range(x0, x1 + 1):
+                boundary[row][column] = True
+        if x0 == x1:
+            for row in range(y0, y1):
+                crossings[row][x0] = not crossings[row][x0]
+
+    # counts[row][column]: outside tiles (well, non-empty outside cells) in all the
+    # cells above and to the left of (row, column)
+    counts = [[0] * (width + 1)]
+    for row in range(height):
+        inside = False
+        running = 0
+        counts.append(sums := [0])
+        for column in range(width):
+            if not boundary[row][column] and not inside and x_sizes[column] and y_sizes[row]:
+                running += 1
+            inside ^= crossings[row][column]
+            sums.append(counts[row][column + 1] + running)
+    return x_index, y_index, counts
+
+
+x_index, y_index, outside = outside_counts(reds)
 
 
 def contains_rectangle(p0, p1):
-    # We only test the interior, so we shrink the rectangle by 1 on all sides.
-    # This helps avoid tricky cases related "walking along the edge".
-    x_min = min(p0.x, p1.x) + 1
-    x_max = max(p0.x, p1.x) - 1
-    y_min = min(p0.y, p1.y) + 1
-    y_max = max(p0.y, p1.y) - 1
-
-    # We test all four edges of the rectangle, this is enough as we know the shape
-    # does not have holes.
-    if bisect(y_lists[x_min], y_min) != bisect(y_lists[x_min], y_max):
-        return False
-    if bisect(y_lists[x_max], y_min) != bisect(y_lists[x_max], y_max):
-        return False
-    if bisect(x_lists[y_min], x_min) != bisect(x_lists[y_min], x_max):
-        return False
-    if bisect(x_lists[y_max], x_min) != bisect(x_lists[y_max], x_max):
-        return False
-
-    # But! If you try really hard you can construct counter-examples
-    # (not for AoC inputs): a '0-width tunnel' could introduce a hole:
-    #
-    # ...RGGGGGGGGR
-    # ...G........G
-    # ...G.RGGGGR.G
-    # ...G.G....G.G
-    # RGRG.GRGR.G.G
-    # G.GG.GG.G.G.G
-    # G.GRGRG.G.G.G
-    # G.RGGGR.G.G.G
-    # G.......G.G.G
-    # G.......RGR.G
-    # G...........G
-    # RGGGGGGGGGGGR
-    #
-    # Now that we checked the edges, we include an extra check for all interior rows
-    # and columns, note that this is NOT needed for AoC inputs, and it should
-    # not be too long as most cases will have already failed (in the main loop,
-    # we start by the bigger rectangles).
-    for y in range(y_min, y_max + 1):
-        if bisect(x_lists[y], x_min) != bisect(x_lists[y], x_max):
-            return False
-    for x in range(x_min, x_max + 1):
-        if bisect(y_lists[x], y_min) != bisect(y_lists[x], y_max):
-            return False
-
-    # Final and very important check: we need to be sure that the constructed
-    # rectangle is actually inside the shape, and not outside of it:
-    #
-    # RGR............RGR
-    # G.G............G.G
-    # G.G............G.G
-    # G.G............G.G
-    # G.G............G.G
-    # G.G............G.G
-    # G.RGGGGGGGGGGGGR.G
-    # G....RGGGGGGR....G
-    # G....G......G....G
-    # RGGGGR......RGGGGR
-    #
-    # Again, this is NOT needed for AoC inputs, but is necessary for correctness.
-    # Testing a single interior point is enough.
-    if bisect(x_lists[y_max], x_max) % 2 == 0:
-        return False
-
-    return True
+    # The rectangle covers the grid cells from one corner to the other, all of them
+    # must be red, green or inside the shape.
+    x0, x1 = sorted((x_index[p0.x], x_index[p1.x]))
+    y0, y1 = sorted((y_index[p0.y], y_index[p1.y]))
+    return outside[y1 + 1][x1 + 1] - outside[y0][x1 + 1] - outside[y1 + 1][x0] + outside[y0][x0] == 0
+
+# This is exact for any shape, including the ones that need extra care when walking
+# along the lines. A '0-width tunnel' could introduce a hole (the cells of the hole
+# are outside):
+#
+# ...RGGGGGGGGR
+# ...G........G
+# ...G.RGGGGR.G
+# ...G.G....G.G
+# RGRG.GRGR.G.G
+# G.GG.GG.G.G.G
+# G.GRGRG.G.G.G
+# G.RGGGR.G.G.G
+# G.......G.G.G
+# G.......RGR.G
+# G...........G
+# RGGGGGGGGGGGR
+#
+# And a rectangle between two red tiles could be entirely outside the shape:
+#
+# RGR............RGR
+# G.G............G.G
+# G.G............G.G
+# G.G............G.G
+# G.G............G.G
+# G.G............G.G
+# G.RGGGGGGGGGGGGR.G
+# G....RGGGGGGR....G
+# G....G......G....G
+# RGGGGR......RGGGGR
 
 
 # As we go from largest to smallest area, the first one we find that is contained
 # must be the largest contained one.
 # I also tested from smallest to largest and kept track of the largest found so far,
 # but it gives similar performance for more complex code in this case.
-for area, pair in decreasing_red_pairs:
+for area, pair in decreasing_red_pairs(reds):
     if contains_rectangle(*pair):
         print(area)
-        # draw(reds, greens, highlights=pair)
+        # draw(reds, green_tiles(reds), highlights=pair)
         break
\ No newline at end of file